@@ -3,8 +3,10 @@ app.py - Main Streamlit Application
 AI-Powered Health Risk Assessment and Monitoring System
 """
 
+import functools
+import html
+import string
 import streamlit as st
-import pandas as pd
 from datetime import datetime
 
 # Page config MUST be first
@@ -17,14 +19,16 @@ st.set_page_config(
 
 # Local imports
 from database import initialize_database, save_assessment, get_patient_assessments, \
-    get_all_patients, get_doctor_patients, add_doctor_note, get_patient_notes, \
-    assign_patient_to_doctor, get_system_stats, get_all_doctors, get_user_by_id
+    get_all_patients, get_doctor_patients, add_doctor_note, get_assessments_for, get_notes_for, \
+    assign_patient_to_doctor, get_system_stats, get_all_doctors, get_user_by_id, pooled_connection, \
+    get_patient_registry, get_patient_summary
 from auth import login_user, logout_user, register_user, is_logged_in, get_current_user
-from model import predict_risk, check_abnormal_vitals, RECOMMENDATIONS
+from model import predict_risk, check_abnormal_vitals, RECOMMENDATIONS, RISK_COLORS
 from utils import (apply_theme, render_header, render_metric_card, render_risk_badge,
                    render_risk_gauge, render_probability_bars, render_assessment_history_chart,
-                   render_risk_distribution_pie, render_vitals_chart,
-                   highlight_abnormal_vitals, simulated_email_alert, format_datetime)
+                   render_risk_distribution_pie, render_vitals_chart, assessment_history,
+                   highlight_abnormal_vitals, simulated_email_alert, format_datetime,
+                   cache_figure)
 from reports import generate_pdf_report
 
 # Initialize DB on startup
@@ -32,6 +36,105 @@ initialize_database()
 apply_theme()
 
 
+# ══════════════════════════════════════════════════════════════
+# HTML TEMPLATES
+# ══════════════════════════════════════════════════════════════
+
+_LOGIN_HERO_HTML = """
+<div style="text-align:center; padding: 40px 0 20px;">
+    <div style="font-size:4rem;">🏥</div>
+    <h1 style="font-family:'DM Serif Display',serif;color:#1a4a7a;font-size:2rem;margin:0;">
+        Health Risk System
+    </h1>
+    <p style="color:#64748b;margin-top:8px;">AI-Powered Health Assessment Platform</p>
+</div>
+"""
+
+_DEMO_ACCOUNTS_HTML = """
+<div style="background:#f0f9ff;border-radius:10px;padding:14px;margin-top:16px;font-size:0.85rem;color:#0369a1;">
+    <strong>Demo Accounts:</strong><br>
+    👤 Patient: <code>patient1</code> / <code>pass123</code><br>
+    👨‍⚕️ Doctor: <code>doctor1</code> / <code>pass123</code><br>
+    🔑 Admin: <code>admin</code> / <code>admin123</code>
+</div>
+"""
+
+_SIDEBAR_TPL = string.Template("""
+<div style="padding:20px 10px 10px; text-align:center;">
+    <div style="width:60px;height:60px;border-radius:50%;background:rgba(255,255,255,0.2);
+                display:flex;align-items:center;justify-content:center;
+                font-size:1.8rem;margin:0 auto 10px;">
+        $icon
+    </div>
+    <div style="font-weight:700;font-size:1rem;">$full_name</div>
+    <div style="font-size:0.8rem;opacity:0.7;margin-top:4px;text-transform:capitalize;">
+        $role
+    </div>
+</div>
+<hr style="border-color:rgba(255,255,255,0.15);margin:10px 0;">
+""")
+
+_ROLE_ICONS = {'patient': '👤', 'doctor': '👨‍⚕️', 'admin': '🔑'}
+
+_CRITICAL_ROW_TPL = string.Template("""
+<div class="alert-high">
+    🔴 <strong>$full_name</strong> — High Risk | 
+    $total_assessments assessments | $email
+</div>
+""")
+
+
+# ══════════════════════════════════════════════════════════════
+# CACHED QUERIES
+# ══════════════════════════════════════════════════════════════
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _stats():
+    return get_system_stats()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _all_patients():
+    return get_all_patients()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _all_doctors():
+    return get_all_doctors()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _doctor_patients(doctor_id):
+    return get_doctor_patients(doctor_id)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _patients_df():
+    import pandas as pd
+    return pd.DataFrame(get_all_patients())
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _patient_registry():
+    return get_patient_registry()
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _login_log_count():
+    with pooled_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM login_logs").fetchone()[0]
+
+
+def _clear_query_caches():
+    """Drop cached reads after a write so the next rerun sees fresh data."""
+    _stats.clear()
+    _all_patients.clear()
+    _all_doctors.clear()
+    _doctor_patients.clear()
+    _patients_df.clear()
+    _patient_registry.clear()
+
+
 # ══════════════════════════════════════════════════════════════
 # AUTH PAGES
 # ══════════════════════════════════════════════════════════════
@@ -40,15 +143,7 @@ def page_login():
     """Login page."""
     col1, col2, col3 = st.columns([1, 1.5, 1])
     with col2:
-        st.markdown("""
-        <div style="text-align:center; padding: 40px 0 20px;">
-            <div style="font-size:4rem;">🏥</div>
-            <h1 style="font-family:'DM Serif Display',serif;color:#1a4a7a;font-size:2rem;margin:0;">
-                Health Risk System
-            </h1>
-            <p style="color:#64748b;margin-top:8px;">AI-Powered Health Assessment Platform</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(_LOGIN_HERO_HTML, unsafe_allow_html=True)
 
         tab_login, tab_register = st.tabs(["🔐 Login", "📝 Register"])
 
@@ -68,14 +163,7 @@ def page_login():
                 else:
                     st.warning("Please fill in all fields.")
 
-            st.markdown("""
-            <div style="background:#f0f9ff;border-radius:10px;padding:14px;margin-top:16px;font-size:0.85rem;color:#0369a1;">
-                <strong>Demo Accounts:</strong><br>
-                👤 Patient: <code>patient1</code> / <code>pass123</code><br>
-                👨‍⚕️ Doctor: <code>doctor1</code> / <code>pass123</code><br>
-                🔑 Admin: <code>admin</code> / <code>admin123</code>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(_DEMO_ACCOUNTS_HTML, unsafe_allow_html=True)
 
         with tab_register:
             st.markdown("<br>", unsafe_allow_html=True)
@@ -90,6 +178,7 @@ def page_login():
             if st.button("Create Account →", key="btn_register"):
                 success, messages = register_user(reg_user, reg_pass, reg_confirm, reg_name, reg_email, reg_role)
                 if success:
+                    _clear_query_caches()
                     st.success(messages[0])
                 else:
                     for msg in messages:
@@ -104,20 +193,11 @@ def render_sidebar():
     """Render the sidebar navigation."""
     user = get_current_user()
     with st.sidebar:
-        st.markdown(f"""
-        <div style="padding:20px 10px 10px; text-align:center;">
-            <div style="width:60px;height:60px;border-radius:50%;background:rgba(255,255,255,0.2);
-                        display:flex;align-items:center;justify-content:center;
-                        font-size:1.8rem;margin:0 auto 10px;">
-                {'👤' if user['role']=='patient' else '👨‍⚕️' if user['role']=='doctor' else '🔑'}
-            </div>
-            <div style="font-weight:700;font-size:1rem;">{user['full_name']}</div>
-            <div style="font-size:0.8rem;opacity:0.7;margin-top:4px;text-transform:capitalize;">
-                {user['role']}
-            </div>
-        </div>
-        <hr style="border-color:rgba(255,255,255,0.15);margin:10px 0;">
-        """, unsafe_allow_html=True)
+        st.markdown(_SIDEBAR_TPL.substitute(
+            icon=_ROLE_ICONS.get(user['role'], '🔑'),
+            full_name=user['full_name'],
+            role=user['role'],
+        ), unsafe_allow_html=True)
 
         if user['role'] == 'patient':
             pages = {
@@ -145,6 +225,10 @@ def render_sidebar():
             is_active = st.session_state.get('current_page') == page_key
             btn_style = "background:rgba(255,255,255,0.2);" if is_active else ""
             if st.button(label, key=f"nav_{page_key}", use_container_width=True):
+                if page_key != st.session_state.get('current_page'):
+                    # Assessment results belong to the visit that produced them
+                    st.session_state.pop('last_assessment', None)
+                    st.session_state.pop('email_alert_pending', None)
                 st.session_state['current_page'] = page_key
                 st.rerun()
 
@@ -160,11 +244,34 @@ def render_sidebar():
 # PATIENT PAGES
 # ══════════════════════════════════════════════════════════════
 
+@st.cache_data(max_entries=32, show_spinner=False)
+def _lazy_pdf(patient_info, vitals, risk_level, risk_score, probabilities, recommendations,
+              abnormal_vitals):
+    """Build the PDF report; only invoked when the user actually clicks download."""
+    return generate_pdf_report(
+        patient_info=patient_info,
+        vitals=vitals,
+        risk_level=risk_level,
+        risk_score=risk_score,
+        probabilities=probabilities,
+        recommendations=recommendations,
+        abnormal_vitals=abnormal_vitals
+    )
+
+
 def page_assess():
     """Risk Assessment page for patients."""
     user = get_current_user()
     render_header("Risk Assessment", "Enter your current vital signs for AI-powered risk classification")
 
+    _vitals_form(user)
+    if 'last_assessment' in st.session_state:
+        _results_panel(user)
+
+
+@st.fragment
+def _vitals_form(user):
+    """Vitals input form; scoring a submission stores it in session state for the results panel."""
     with st.form("vitals_form"):
         st.markdown('<div class="section-title">📋 Vital Signs Input</div>', unsafe_allow_html=True)
 
@@ -215,49 +322,63 @@ def page_assess():
 
         # Save to DB
         save_assessment(user['id'], vitals, risk_level, risk_score, notes)
+        _clear_query_caches()
 
-        # Results
-        st.markdown("---")
-        st.markdown('<div class="section-title">📊 Assessment Results</div>', unsafe_allow_html=True)
-
-        col1, col2 = st.columns([1, 1])
-
-        with col1:
-            render_risk_badge(risk_level)
-            st.plotly_chart(render_risk_gauge(risk_score, risk_level), use_container_width=True)
-
-        with col2:
-            st.plotly_chart(render_probability_bars(probabilities), use_container_width=True)
-            highlight_abnormal_vitals(abnormal)
-
-        simulated_email_alert(user['full_name'], risk_level)
-
-        # Recommendations
-        st.markdown("---")
-        st.markdown('<div class="section-title">💊 Recommendations</div>', unsafe_allow_html=True)
-        alert_class = f"alert-{risk_level.lower()}"
-        recs = RECOMMENDATIONS.get(risk_level, [])
-        recs_html = "".join([f"<div style='margin:4px 0;'>{r}</div>" for r in recs])
-        st.markdown(f'<div class="{alert_class}">{recs_html}</div>', unsafe_allow_html=True)
-
-        # PDF Download
-        st.markdown("---")
-        pdf_bytes = generate_pdf_report(
+        st.session_state['last_assessment'] = dict(
             patient_info=user,
             vitals=vitals,
             risk_level=risk_level,
             risk_score=risk_score,
             probabilities=probabilities,
-            recommendations=recs,
+            recommendations=RECOMMENDATIONS.get(risk_level, []),
             abnormal_vitals=abnormal
         )
-        st.download_button(
-            label="📄 Download PDF Report",
-            data=pdf_bytes,
-            file_name=f"health_report_{user['username']}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
-            mime="application/pdf",
-            use_container_width=True
-        )
+        st.session_state['email_alert_pending'] = True
+        st.rerun()
+
+
+def _results_panel(user):
+    """Results, recommendations and PDF download for the last submitted assessment."""
+    last = st.session_state['last_assessment']
+    risk_level = last['risk_level']
+
+    st.markdown("---")
+    st.markdown('<div class="section-title">📊 Assessment Results</div>', unsafe_allow_html=True)
+
+    col1, col2 = st.columns([1, 1])
+
+    with col1:
+        render_risk_badge(risk_level)
+        st.plotly_chart(render_risk_gauge(last['risk_score'], risk_level), use_container_width=True)
+
+    with col2:
+        st.plotly_chart(render_probability_bars(last['probabilities']), use_container_width=True)
+        highlight_abnormal_vitals(last['abnormal_vitals'])
+
+    # The alert goes out once per submission, not on every rerun of the results
+    if st.session_state.pop('email_alert_pending', False):
+        simulated_email_alert(user['full_name'], risk_level)
+
+    # Recommendations
+    st.markdown("---")
+    st.markdown('<div class="section-title">💊 Recommendations</div>', unsafe_allow_html=True)
+    alert_class = f"alert-{risk_level.lower()}"
+    recs_html = "".join([f"<div style='margin:4px 0;'>{r}</div>" for r in last['recommendations']])
+    st.markdown(f'<div class="{alert_class}">{recs_html}</div>', unsafe_allow_html=True)
+
+    # PDF Download (generated on click, not on every submission)
+    st.markdown("---")
+    st.download_button(
+        label="📄 Download PDF Report",
+        data=functools.partial(_lazy_pdf, **last),
+        file_name=f"health_report_{user['username']}_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
+        mime="application/pdf",
+        on_click="ignore",
+        use_container_width=True
+    )
+
+
+DASHBOARD_CHART_LIMIT = 50
 
 
 def page_patient_dashboard():
@@ -265,15 +386,15 @@ def page_patient_dashboard():
     user = get_current_user()
     render_header("My Health Dashboard", f"Welcome back, {user['full_name']}")
 
-    assessments = get_patient_assessments(user['id'])
+    summary = get_patient_summary(user['id'])
 
-    if not assessments:
+    if not summary['total']:
         st.info("No assessments yet. Go to Risk Assessment to get started!")
         return
 
-    latest = assessments[0]
-    total = len(assessments)
-    high_count = sum(1 for a in assessments if a['risk_level'] == 'High')
+    latest = summary['latest']
+    total = summary['total']
+    high_count = summary['high_count']
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -286,17 +407,19 @@ def page_patient_dashboard():
     with col4:
         render_metric_card("Last Assessed", format_datetime(latest['assessed_at'])[:10], "📅", "")
 
+    history = assessment_history(get_patient_assessments(user['id'], limit=DASHBOARD_CHART_LIMIT))
+
     col1, col2 = st.columns(2)
     with col1:
-        fig = render_assessment_history_chart(assessments)
+        fig = render_assessment_history_chart(history)
         if fig:
             st.plotly_chart(fig, use_container_width=True)
     with col2:
-        fig = render_risk_distribution_pie(assessments)
+        fig = render_risk_distribution_pie(history)
         if fig:
             st.plotly_chart(fig, use_container_width=True)
 
-    fig = render_vitals_chart(assessments)
+    fig = render_vitals_chart(history)
     if fig:
         st.plotly_chart(fig, use_container_width=True)
 
@@ -312,24 +435,27 @@ def page_patient_history():
         st.info("No assessments found.")
         return
 
-    for a in assessments:
-        risk = a['risk_level']
-        color = {'Low': '#d1fae5', 'Medium': '#fef3c7', 'High': '#fee2e2'}.get(risk, '#f8fafc')
-        border = {'Low': '#2ecc71', 'Medium': '#f39c12', 'High': '#e74c3c'}.get(risk, '#e2e8f0')
-
-        with st.expander(f"📋 {format_datetime(a['assessed_at'])} — {risk} Risk"):
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("Risk Level", risk)
-                st.metric("Confidence", f"{a['risk_score']:.1f}%")
-            with col2:
-                st.metric("Heart Rate", f"{a['heart_rate']} bpm")
-                st.metric("Respiratory Rate", f"{a['respiratory_rate']}")
-            with col3:
-                st.metric("SpO2", f"{a['oxygen_saturation']}%")
-                st.metric("Systolic BP", f"{a['systolic_bp']} mmHg")
-            if a.get('notes'):
-                st.markdown(f"**Notes:** {a['notes']}")
+    rows_html = "\n".join(_history_row_html(a) for a in assessments)
+    st.markdown(rows_html, unsafe_allow_html=True)
+
+
+def _history_row_html(a):
+    """One collapsible history card; colours come from the .history-<risk> CSS classes."""
+    risk = a['risk_level']
+    notes = f'<div class="history-notes"><strong>Notes:</strong> {html.escape(a["notes"])}</div>' \
+        if a.get('notes') else ''
+    return (
+        f'<details class="history-card history-{risk.lower()}">'
+        f'<summary>📋 {format_datetime(a["assessed_at"])} — {risk} Risk</summary>'
+        f'<div class="history-grid">'
+        f'<div><span>Risk Level</span><strong>{risk}</strong></div>'
+        f'<div><span>Heart Rate</span><strong>{a["heart_rate"]} bpm</strong></div>'
+        f'<div><span>SpO2</span><strong>{a["oxygen_saturation"]}%</strong></div>'
+        f'<div><span>Confidence</span><strong>{a["risk_score"]:.1f}%</strong></div>'
+        f'<div><span>Respiratory Rate</span><strong>{a["respiratory_rate"]}</strong></div>'
+        f'<div><span>Systolic BP</span><strong>{a["systolic_bp"]} mmHg</strong></div>'
+        f'</div>{notes}</details>'
+    )
 
 
 # ══════════════════════════════════════════════════════════════
@@ -341,8 +467,7 @@ def page_doctor_home():
     user = get_current_user()
     render_header("Doctor Portal", f"Welcome, Dr. {user['full_name']}")
 
-    patients = get_doctor_patients(user['id'])
-    all_p = get_all_patients()
+    patients = _doctor_patients(user['id'])
 
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -358,12 +483,7 @@ def page_doctor_home():
     if critical:
         st.markdown("### 🚨 Critical Patients Requiring Attention")
         for p in critical:
-            st.markdown(f"""
-            <div class="alert-high">
-                🔴 <strong>{p['full_name']}</strong> — High Risk | 
-                {p['total_assessments']} assessments | {p['email']}
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(_CRITICAL_ROW_TPL.substitute(p), unsafe_allow_html=True)
 
 
 def page_doctor_patients():
@@ -371,73 +491,84 @@ def page_doctor_patients():
     user = get_current_user()
     render_header("My Patients", "Manage and monitor your assigned patients")
 
-    patients = get_doctor_patients(user['id'])
+    patients = _doctor_patients(user['id'])
 
     if not patients:
         st.info("No patients assigned to you yet.")
 
         # Assign patients
         st.markdown("### Assign a Patient")
-        all_p = get_all_patients()
+        all_p = _all_patients()
         unassigned = [p for p in all_p if not p.get('assigned_doctor_id')]
         if unassigned:
+            name_by_id = {p['id']: p['full_name'] for p in unassigned}
             selected = st.selectbox("Select patient to assign",
-                options=[p['id'] for p in unassigned],
-                format_func=lambda x: next(p['full_name'] for p in unassigned if p['id'] == x)
+                options=list(name_by_id),
+                format_func=name_by_id.__getitem__
             )
             if st.button("Assign to Me"):
                 assign_patient_to_doctor(selected, user['id'])
+                _clear_query_caches()
                 st.success("Patient assigned!")
                 st.rerun()
         return
 
+    patient_ids = [p['id'] for p in patients]
+    assessments_by_patient = get_assessments_for(patient_ids)
+    notes_by_patient = get_notes_for(patient_ids, limit_per=3)
+
     for p in patients:
-        risk = p.get('latest_risk', 'Unknown')
-        color_cls = {'Low': 'success', 'Medium': 'warning', 'High': 'danger'}.get(risk, '')
-
-        with st.expander(f"👤 {p['full_name']} — {risk or 'No assessment'} Risk"):
-            col1, col2 = st.columns(2)
-            with col1:
-                st.write(f"**Email:** {p['email']}")
-                st.write(f"**Total Assessments:** {p['total_assessments']}")
-                st.write(f"**Latest Risk:** {risk or 'N/A'}")
-            with col2:
-                # View patient assessments
-                assessments = get_patient_assessments(p['id'])
-                if assessments:
-                    latest = assessments[0]
-                    st.metric("Last HR", f"{latest['heart_rate']} bpm")
-                    st.metric("Last SpO2", f"{latest['oxygen_saturation']}%")
-
-            # Doctor notes
-            st.markdown("**📝 Add Note:**")
-            note_text = st.text_area("Note", key=f"note_{p['id']}", height=80)
-            is_critical = st.checkbox("Mark as Critical", key=f"crit_{p['id']}")
-            if st.button("Save Note", key=f"save_note_{p['id']}"):
-                if note_text:
-                    add_doctor_note(user['id'], p['id'], note_text, is_critical)
-                    st.success("Note saved!")
-                    st.rerun()
-
-            # Show existing notes
-            notes = get_patient_notes(p['id'])
-            if notes:
-                st.markdown("**Previous Notes:**")
-                for note in notes[:3]:
-                    crit_badge = "🚨 CRITICAL — " if note['is_critical'] else ""
-                    st.markdown(f"""
-                    <div style="background:#f8fafc;border-radius:8px;padding:10px;margin:4px 0;
-                                border-left:3px solid {'#e74c3c' if note['is_critical'] else '#1a4a7a'};">
-                        <small style="color:#64748b;">{crit_badge}{format_datetime(note['created_at'])}</small><br>
-                        {note['note']}
-                    </div>
-                    """, unsafe_allow_html=True)
-
-            # Assessment chart
-            if len(assessments) >= 2:
-                fig = render_assessment_history_chart(assessments)
-                if fig:
-                    st.plotly_chart(fig, use_container_width=True)
+        _patient_panel(user, p, assessments_by_patient.get(p['id'], []),
+                       notes_by_patient.get(p['id'], []))
+
+
+@st.fragment
+def _patient_panel(user, p, assessments, notes):
+    """One patient's expander; note edits rerun only this fragment."""
+    risk = p.get('latest_risk', 'Unknown')
+    color_cls = {'Low': 'success', 'Medium': 'warning', 'High': 'danger'}.get(risk, '')
+
+    with st.expander(f"👤 {p['full_name']} — {risk or 'No assessment'} Risk"):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write(f"**Email:** {p['email']}")
+            st.write(f"**Total Assessments:** {p['total_assessments']}")
+            st.write(f"**Latest Risk:** {risk or 'N/A'}")
+        with col2:
+            # View patient assessments
+            if assessments:
+                latest = assessments[0]
+                st.metric("Last HR", f"{latest['heart_rate']} bpm")
+                st.metric("Last SpO2", f"{latest['oxygen_saturation']}%")
+
+        # Doctor notes
+        st.markdown("**📝 Add Note:**")
+        note_text = st.text_area("Note", key=f"note_{p['id']}", height=80)
+        is_critical = st.checkbox("Mark as Critical", key=f"crit_{p['id']}")
+        if st.button("Save Note", key=f"save_note_{p['id']}"):
+            if note_text:
+                add_doctor_note(user['id'], p['id'], note_text, is_critical)
+                st.success("Note saved!")
+                st.rerun()
+
+        # Show existing notes
+        if notes:
+            st.markdown("**Previous Notes:**")
+            for note in notes:
+                crit_badge = "🚨 CRITICAL — " if note['is_critical'] else ""
+                st.markdown(f"""
+                <div style="background:#f8fafc;border-radius:8px;padding:10px;margin:4px 0;
+                            border-left:3px solid {'#e74c3c' if note['is_critical'] else '#1a4a7a'};">
+                    <small style="color:#64748b;">{crit_badge}{format_datetime(note['created_at'])}</small><br>
+                    {note['note']}
+                </div>
+                """, unsafe_allow_html=True)
+
+        # Assessment chart
+        if len(assessments) >= 2:
+            fig = render_assessment_history_chart(assessment_history(assessments))
+            if fig:
+                st.plotly_chart(fig, use_container_width=True)
 
 
 def page_doctor_search():
@@ -445,38 +576,63 @@ def page_doctor_search():
     render_header("Search Patients", "Find and view any patient's records")
 
     search_query = st.text_input("🔍 Search by name or email", placeholder="Type to search...")
-    all_patients = get_all_patients()
+    df = _patients_df()
 
-    if search_query:
-        results = [p for p in all_patients if
-                   search_query.lower() in p['full_name'].lower() or
-                   search_query.lower() in p['email'].lower()]
+    if search_query and not df.empty:
+        mask = (df['full_name'].str.contains(search_query, case=False, regex=False, na=False) |
+                df['email'].str.contains(search_query, case=False, regex=False, na=False))
+        results = df[mask]
     else:
-        results = all_patients
+        results = df
 
     st.markdown(f"**{len(results)} patient(s) found**")
 
-    for p in results:
-        risk = p.get('latest_risk', 'N/A')
-        with st.expander(f"👤 {p['full_name']} ({p['email']}) — {risk} Risk"):
-            assessments = get_patient_assessments(p['id'])
-            st.write(f"Total Assessments: {p['total_assessments']}")
-            if assessments:
-                df = pd.DataFrame(assessments[:10])
-                cols = ['assessed_at', 'risk_level', 'risk_score', 'heart_rate',
-                        'respiratory_rate', 'oxygen_saturation', 'systolic_bp']
-                st.dataframe(df[cols], use_container_width=True)
+    if results.empty:
+        return
+
+    # Last 10 assessments of every match in one query, split into per-patient frames once
+    recent = get_assessments_for(results['id'].tolist(), limit_per=10)
+    import pandas as pd
+    recent_df = pd.DataFrame([row for rows in recent.values() for row in rows])
+    by_patient = dict(tuple(recent_df.groupby('patient_id'))) if not recent_df.empty else {}
+    cols = ['assessed_at', 'risk_level', 'risk_score', 'heart_rate',
+            'respiratory_rate', 'oxygen_saturation', 'systolic_bp']
+
+    for p in results.itertuples(index=False):
+        risk = p.latest_risk
+        with st.expander(f"👤 {p.full_name} ({p.email}) — {risk} Risk"):
+            st.write(f"Total Assessments: {p.total_assessments}")
+            patient_df = by_patient.get(p.id)
+            if patient_df is not None:
+                st.dataframe(patient_df, column_order=cols, hide_index=True, use_container_width=True)
 
 
 # ══════════════════════════════════════════════════════════════
 # ADMIN PAGES
 # ══════════════════════════════════════════════════════════════
 
+@cache_figure(ttl=30, show_spinner=False)
+def _risk_bar(high, medium, low):
+    """System-wide risk distribution bar chart, rebuilt only when the counts change."""
+    import plotly.graph_objects as go
+    counts = {'High': high, 'Medium': medium, 'Low': low}
+    fig = go.Figure([
+        go.Bar(x=[level], y=[count], name=level, marker_color=RISK_COLORS[level],
+               hovertemplate='Risk Level=%{x}<br>Count=%{y}<extra></extra>')
+        for level, count in counts.items()
+    ])
+    fig.update_layout(title='System-wide Risk Distribution', barmode='relative',
+                      xaxis_title='Risk Level', yaxis_title='Count', legend_title_text='Risk Level',
+                      paper_bgcolor='white', plot_bgcolor='#f8fafc',
+                      font={'family': 'DM Sans'}, height=300)
+    return fig
+
+
 def page_admin_dashboard():
     """Admin analytics dashboard."""
     render_header("Admin Dashboard", "System-wide analytics and monitoring")
 
-    stats = get_system_stats()
+    stats = _stats()
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -497,18 +653,7 @@ def page_admin_dashboard():
         render_metric_card("Low Risk", stats['low_risk_count'], "🟢", "success")
 
     # Risk distribution chart
-    import plotly.express as px
-    risk_data = {
-        'Risk Level': ['High', 'Medium', 'Low'],
-        'Count': [stats['high_risk_count'], stats['medium_risk_count'], stats['low_risk_count']]
-    }
-    df = pd.DataFrame(risk_data)
-    fig = px.bar(df, x='Risk Level', y='Count',
-                 color='Risk Level',
-                 color_discrete_map={'High': '#e74c3c', 'Medium': '#f39c12', 'Low': '#2ecc71'},
-                 title='System-wide Risk Distribution')
-    fig.update_layout(paper_bgcolor='white', plot_bgcolor='#f8fafc',
-                      font={'family': 'DM Sans'}, height=300)
+    fig = _risk_bar(stats['high_risk_count'], stats['medium_risk_count'], stats['low_risk_count'])
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -516,56 +661,61 @@ def page_all_patients():
     """Admin view of all patients."""
     render_header("All Patients", "Complete patient registry")
 
-    patients = get_all_patients()
-    doctors = get_all_doctors()
-    doctor_map = {d['id']: d['full_name'] for d in doctors}
+    df = _patient_registry()
+    doctors = _all_doctors()
 
-    st.markdown(f"**Total patients: {len(patients)}**")
+    st.markdown(f"**Total patients: {len(df)}**")
 
-    df = pd.DataFrame(patients)
     if not df.empty:
-        df['assigned_doctor'] = df['assigned_doctor_id'].map(doctor_map).fillna('Unassigned')
         display_cols = ['full_name', 'email', 'latest_risk', 'total_assessments',
                         'assigned_doctor', 'status', 'created_at']
-        available = [c for c in display_cols if c in df.columns]
-        st.dataframe(df[available], use_container_width=True)
+        st.dataframe(df, column_order=display_cols, use_container_width=True)
 
         # Assign doctors
         st.markdown("### Assign Doctor to Patient")
+        patient_name = dict(zip(df['id'].tolist(), df['full_name']))
+        doc_name = {d['id']: d['full_name'] for d in doctors}
         col1, col2, col3 = st.columns(3)
         with col1:
-            patient_sel = st.selectbox("Patient", options=[p['id'] for p in patients],
-                                       format_func=lambda x: next(p['full_name'] for p in patients if p['id'] == x))
+            patient_sel = st.selectbox("Patient", options=list(patient_name),
+                                       format_func=patient_name.__getitem__)
         with col2:
-            doctor_sel = st.selectbox("Doctor", options=[d['id'] for d in doctors],
-                                      format_func=lambda x: next(d['full_name'] for d in doctors if d['id'] == x))
+            doctor_sel = st.selectbox("Doctor", options=list(doc_name),
+                                      format_func=doc_name.__getitem__)
         with col3:
             st.markdown("<br>", unsafe_allow_html=True)
             if st.button("Assign"):
                 assign_patient_to_doctor(patient_sel, doctor_sel)
+                _clear_query_caches()
                 st.success("Patient assigned!")
                 st.rerun()
 
 
+AUDIT_PAGE_SIZE = 25
+
+
 def page_audit_logs():
     """Admin audit log viewer."""
-    from database import get_connection
     render_header("Audit Logs", "System login and activity logs")
 
-    conn = get_connection()
-    logs = conn.execute("""
-        SELECT ll.*, u.username, u.role FROM login_logs ll
-        JOIN users u ON ll.user_id = u.id
-        ORDER BY ll.logged_at DESC LIMIT 100
-    """).fetchall()
-    conn.close()
+    total = _login_log_count()
+    if not total:
+        st.info("No logs yet.")
+        return
 
-    df = pd.DataFrame([dict(r) for r in logs])
+    page_count = (total + AUDIT_PAGE_SIZE - 1) // AUDIT_PAGE_SIZE
+    page = st.number_input("Page", min_value=1, max_value=page_count, value=1)
+    st.caption(f"Page {page} of {page_count} · {total} entries")
+
+    import pandas as pd
+    with pooled_connection() as conn:
+        df = pd.read_sql_query("""
+            SELECT ll.logged_at, u.username, u.role, ll.action, ll.ip_address FROM login_logs ll
+            JOIN users u ON ll.user_id = u.id
+            ORDER BY ll.logged_at DESC LIMIT ? OFFSET ?
+        """, conn, params=(AUDIT_PAGE_SIZE, (page - 1) * AUDIT_PAGE_SIZE))
     if not df.empty:
-        st.dataframe(df[['logged_at', 'username', 'role', 'action', 'ip_address']],
-                     use_container_width=True)
-    else:
-        st.info("No logs yet.")
+        st.dataframe(df, use_container_width=True)
 
 
 # ══════════════════════════════════════════════════════════════
@@ -9,24 +9,52 @@ import secrets
 import streamlit as st
 from database import get_user_by_username, create_user, log_login
 
+SCRYPT_N = 16384
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_DKLEN = 32
+
+
+def _scrypt_hex(password: str, salt: str, n: int, r: int, p: int) -> str:
+    """Derive a hex-encoded scrypt key from a password and hex salt."""
+    return hashlib.scrypt(password.encode(), salt=bytes.fromhex(salt),
+                          n=n, r=r, p=p, dklen=SCRYPT_DKLEN).hex()
+
 
 def hash_password(password: str) -> str:
-    """Hash a password using SHA-256 with a salt."""
+    """Hash a password with scrypt, encoding the cost parameters alongside the salt."""
     salt = secrets.token_hex(16)
-    pwd_hash = hashlib.sha256((salt + password).encode()).hexdigest()
-    return f"{salt}:{pwd_hash}"
+    pwd_hash = _scrypt_hex(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt$n={SCRYPT_N}$r={SCRYPT_R}$p={SCRYPT_P}${salt}${pwd_hash}"
 
 
 def verify_password(password: str, stored_hash: str) -> bool:
-    """Verify a password against its stored hash."""
+    """Verify a password against its stored hash (scrypt or legacy salted SHA-256)."""
     try:
-        salt, pwd_hash = stored_hash.split(":")
-        expected = hashlib.sha256((salt + password).encode()).hexdigest()
+        if stored_hash.startswith("scrypt$"):
+            _, n, r, p, salt, pwd_hash = stored_hash.split("$")
+            expected = _scrypt_hex(password, salt, int(n[2:]), int(r[2:]), int(p[2:]))
+        else:
+            # Legacy format: sha256 over the hex salt text followed by the password
+            salt, pwd_hash = stored_hash.split(":")
+            hasher = hashlib.sha256(salt.encode())
+            hasher.update(password.encode())
+            expected = hasher.hexdigest()
         return hmac.compare_digest(expected, pwd_hash)
     except Exception:
         return False
 
 
+@st.cache_data(ttl=60, max_entries=256, show_spinner=False)
+def _verify_cached(username: str, pwd_token: str, stored_hash: str, _password: str) -> bool:
+    """Memoized verify_password keyed on a digest of the password, never the plaintext.
+
+    Streamlit excludes underscore-prefixed arguments from the cache key, so
+    only (username, pwd_token, stored_hash) identifies an entry.
+    """
+    return verify_password(_password, stored_hash)
+
+
 def validate_registration(username, password, confirm_password, full_name, email, role):
     """Validate registration form inputs."""
     errors = []
@@ -52,7 +80,7 @@ def register_user(username, password, confirm_password, full_name, email, role):
         return False, errors
 
     password_hash = hash_password(password)
-    success, message = create_user(username, password_hash, full_name, email, role)
+    success, message, _ = create_user(username, password_hash, full_name, email, role)
     if success:
         return True, ["Registration successful! Please log in."]
     return False, [message]
@@ -67,7 +95,8 @@ def login_user(username, password):
     if not user:
         return False, "Invalid username or password."
 
-    if not verify_password(password, user['password_hash']):
+    pwd_token = hashlib.sha256(password.encode()).hexdigest()
+    if not _verify_cached(username, pwd_token, user['password_hash'], password):
         return False, "Invalid username or password."
 
     # Set session state
@@ -87,7 +116,8 @@ def logout_user():
     if 'user_id' in st.session_state:
         log_login(st.session_state['user_id'], 'logout')
 
-    keys_to_clear = ['logged_in', 'user_id', 'username', 'full_name', 'role', 'email']
+    keys_to_clear = ['logged_in', 'user_id', 'username', 'full_name', 'role', 'email',
+                     'last_assessment', 'email_alert_pending']
     for key in keys_to_clear:
         if key in st.session_state:
             del st.session_state[key]
@@ -0,0 +1,102 @@
+"""
+convert_model.py - Convert the trained Keras model to a TensorFlow Lite model
+Run this after adding or retraining risk_model.h5: python convert_model.py
+
+The fitted scaler is folded into the first Dense layer, so the converted model
+takes raw vitals and the app no longer needs scaler.pkl on the TFLite path.
+Weights are quantized to int8 but activations stay float: raw vitals span
+0-300, and a single int8 input scale over that range (~1.2 units per step)
+would erase clinically relevant differences such as 37.5 vs 38.2 °C.
+"""
+
+import pickle
+import numpy as np
+import tensorflow as tf
+
+N_NUMERICAL = 6  # scaled inputs; consciousness and on_oxygen follow unscaled
+
+# Sampling ranges for the verification rows, matching the assessment form limits
+INPUT_RANGES = [
+    (0, 60),      # respiratory_rate
+    (50, 100),    # oxygen_saturation
+    (0, 5),       # o2_scale
+    (50, 300),    # systolic_bp
+    (20, 250),    # heart_rate
+    (30.0, 45.0), # temperature
+    (0, 1),       # consciousness != 'A'
+    (0, 1),       # on_oxygen
+]
+
+
+def fold_scaler(model, scaler):
+    """Return a copy of model whose first Dense layer also applies scaler.transform.
+
+    The scaler is affine, transform(x) = x @ A + c, so for the first layer
+    (x @ A + c) @ W + b == x @ (A @ W) + (c @ W + b).
+    """
+    folded = tf.keras.models.clone_model(model)
+    folded.set_weights(model.get_weights())
+    dense = next(layer for layer in folded.layers if isinstance(layer, tf.keras.layers.Dense))
+    kernel, bias = dense.get_weights()
+
+    c = scaler.transform(np.zeros((1, N_NUMERICAL)))[0]
+    A = scaler.transform(np.eye(N_NUMERICAL)) - c
+    kernel = kernel.copy()
+    bias = bias + c @ kernel[:N_NUMERICAL]
+    kernel[:N_NUMERICAL] = A @ kernel[:N_NUMERICAL]
+    dense.set_weights([kernel.astype(np.float32), bias.astype(np.float32)])
+    return folded
+
+
+def sample_inputs(n=2000, seed=0):
+    """Raw (n, 8) input rows spanning the form ranges, used to verify the conversion."""
+    rng = np.random.default_rng(seed)
+    low, high = np.array(INPUT_RANGES, dtype=np.float32).T
+    rows = rng.uniform(low, high, size=(n, len(INPUT_RANGES))).astype(np.float32)
+    rows[:, N_NUMERICAL:] = np.round(rows[:, N_NUMERICAL:])
+    return rows
+
+
+def tflite_predict(tflite_model, rows):
+    """Class predictions of a converted model for raw input rows, one row at a time."""
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]['index']
+    output_index = interpreter.get_output_details()[0]['index']
+    preds = np.empty(len(rows), dtype=np.int64)
+    for i, row in enumerate(rows):
+        interpreter.set_tensor(input_index, row[None, :])
+        interpreter.invoke()
+        preds[i] = interpreter.get_tensor(output_index)[0].argmax()
+    return preds
+
+
+def convert(src="risk_model.h5", scaler_path="scaler.pkl", dst="risk_model.tflite"):
+    model = tf.keras.models.load_model(src)
+    with open(scaler_path, "rb") as f:
+        scaler = pickle.load(f)
+
+    # Dynamic-range quantization: int8 weights, float inputs and activations
+    converter = tf.lite.TFLiteConverter.from_keras_model(fold_scaler(model, scaler))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    tflite_model = converter.convert()
+
+    # The app switches to the TFLite model whenever the file exists, so only
+    # write it if it classifies exactly like the scaled Keras model
+    rows = sample_inputs()
+    scaled = rows.copy()
+    scaled[:, :N_NUMERICAL] = scaler.transform(rows[:, :N_NUMERICAL])
+    expected = model.predict(scaled, verbose=0).argmax(axis=1)
+    mismatches = int((tflite_predict(tflite_model, rows) != expected).sum())
+    if mismatches:
+        raise SystemExit(f"❌ TFLite predictions differ from Keras on {mismatches}/{len(rows)} "
+                         f"sample rows; {dst} not written")
+
+    with open(dst, "wb") as f:
+        f.write(tflite_model)
+    print(f"✅ Wrote {dst} ({len(tflite_model):,} bytes, scaler folded in, int8 weights, "
+          f"matches Keras on {len(rows)} sample rows)")
+
+
+if __name__ == "__main__":
+    convert()
@@ -5,297 +5,629 @@ Handles all database interactions for the Health Risk Assessment System
 
 import sqlite3
 import os
+import atexit
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import islice
 
 DB_PATH = "health_risk.db"
-
-
-def get_connection():
-    """Get a database connection with foreign keys enabled."""
-    conn = sqlite3.connect(DB_PATH)
+SCHEMA_VERSION = 1         # bump when initialize_database gains tables or indexes
+
+LOG_FLUSH_BATCH = 1000     # max login events written per transaction
+LOG_FLUSH_INTERVAL = 0.5   # seconds the flusher waits to fill a batch
+LOG_RETRY_MAX_DELAY = 30.0 # cap on the flusher's backoff after a failed write
+BULK_CHUNK = 10000         # rows per executemany in the bulk insert helpers
+POOL_SIZE = 8              # max open connections, shared by every session and thread
+
+logger = logging.getLogger(__name__)
+
+_initialized = False
+_local = threading.local()
+# Idle connections, most recently used on top so warm page caches get reused;
+# a None slot is opened on first checkout
+_pool = queue.LifoQueue()
+for _ in range(POOL_SIZE):
+    _pool.put(None)
+_open_connections = []
+_login_queue = queue.Queue()
+_flusher_lock = threading.Lock()
+_flusher_thread = None
+
+
+def _apply_pragmas(conn):
+    """Tune a new connection. WAL is persisted in the file, so it is only set once per process."""
+    global _initialized
     conn.execute("PRAGMA foreign_keys = ON")
-    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA mmap_size = 268435456")
+    conn.execute("PRAGMA cache_size = -65536")
+    if not _initialized:
+        conn.execute("PRAGMA journal_mode = WAL")
+        _initialized = True
+
+
+def _open_connection():
+    """Open and tune a new pool connection."""
+    # Connections move between threads as they are checked in and out
+    conn = sqlite3.connect(DB_PATH, detect_types=0, isolation_level=None, check_same_thread=False)
+    _apply_pragmas(conn)
+    _open_connections.append(conn)
     return conn
 
 
-def initialize_database():
-    """Create all tables if they don't exist."""
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Users table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            full_name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            role TEXT NOT NULL CHECK(role IN ('patient', 'doctor', 'admin')),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_active INTEGER DEFAULT 1
-        )
-    """)
-
-    # Patients table (extended profile)
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS patients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL UNIQUE,
-            date_of_birth TEXT,
-            gender TEXT,
-            blood_type TEXT,
-            phone TEXT,
-            address TEXT,
-            assigned_doctor_id INTEGER,
-            status TEXT DEFAULT 'active',
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (assigned_doctor_id) REFERENCES users(id)
-        )
-    """)
-
-    # Assessments table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS assessments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patient_id INTEGER NOT NULL,
-            respiratory_rate REAL,
-            oxygen_saturation REAL,
-            o2_scale REAL,
-            systolic_bp REAL,
-            heart_rate REAL,
-            temperature REAL,
-            consciousness TEXT,
-            on_oxygen INTEGER,
-            risk_level TEXT NOT NULL,
-            risk_score REAL,
-            notes TEXT,
-            assessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (patient_id) REFERENCES users(id)
-        )
-    """)
-
-    # Doctor notes table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS doctor_notes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            doctor_id INTEGER NOT NULL,
-            patient_id INTEGER NOT NULL,
-            note TEXT NOT NULL,
-            is_critical INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (doctor_id) REFERENCES users(id),
-            FOREIGN KEY (patient_id) REFERENCES users(id)
-        )
-    """)
-
-    # Login logs table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS login_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            action TEXT NOT NULL,
-            ip_address TEXT DEFAULT 'localhost',
-            logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id)
-        )
-    """)
+@contextmanager
+def pooled_connection():
+    """Check a connection out of the pool for the enclosed block.
+
+    Blocks while all POOL_SIZE connections are in use. Nested use on the same
+    thread shares the outer block's connection, so helpers called inside a
+    transaction() run in that transaction.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        yield conn
+        return
+
+    conn = _pool.get()
+    if conn is None:
+        try:
+            conn = _open_connection()
+        except BaseException:
+            _pool.put(None)
+            raise
+    _local.conn = conn
+    try:
+        yield conn
+    finally:
+        _local.conn = None
+        _pool.put(conn)
+
+
+@atexit.register
+def _close_connections():
+    """Close every pooled connection at interpreter exit."""
+    for conn in _open_connections:
+        conn.close()
 
-    conn.commit()
-    conn.close()
+
+@contextmanager
+def transaction():
+    """Run the enclosed statements on a pooled connection as one BEGIN ... COMMIT.
+
+    Connections are in autocommit mode (isolation_level=None), so writes that
+    must be atomic, or batched into one commit, go through this. Nested use
+    becomes a SAVEPOINT, so a failing inner block only undoes its own work.
+    """
+    with pooled_connection() as conn:
+        if conn.in_transaction:
+            conn.execute("SAVEPOINT nested")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK TO nested")
+                conn.execute("RELEASE nested")
+                raise
+            conn.execute("RELEASE nested")
+            return
+
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def _fetch_dicts(cursor):
+    """Build result dicts straight from the row tuples, without an intermediate sqlite3.Row."""
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def _fetch_dict(cursor):
+    """First row of the result as a dict, or None."""
+    row = cursor.fetchone()
+    return dict(zip([c[0] for c in cursor.description], row)) if row else None
+
+
+def initialize_database():
+    """Create all tables and indexes if the schema is older than SCHEMA_VERSION.
+
+    Runs every DDL statement in one transaction and records the version in
+    PRAGMA user_version, so later starts exit after a single PRAGMA read.
+    """
+    with pooled_connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        return
+
+    with transaction() as conn:
+        cursor = conn.cursor()
+
+        # Users table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                full_name TEXT NOT NULL,
+                email TEXT UNIQUE NOT NULL,
+                role TEXT NOT NULL CHECK(role IN ('patient', 'doctor', 'admin')),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                is_active INTEGER DEFAULT 1
+            )
+        """)
+
+        # Patients table (extended profile)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS patients (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL UNIQUE,
+                date_of_birth TEXT,
+                gender TEXT,
+                blood_type TEXT,
+                phone TEXT,
+                address TEXT,
+                assigned_doctor_id INTEGER,
+                status TEXT DEFAULT 'active',
+                FOREIGN KEY (user_id) REFERENCES users(id),
+                FOREIGN KEY (assigned_doctor_id) REFERENCES users(id)
+            )
+        """)
+
+        # Assessments table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS assessments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id INTEGER NOT NULL,
+                respiratory_rate REAL,
+                oxygen_saturation REAL,
+                o2_scale REAL,
+                systolic_bp REAL,
+                heart_rate REAL,
+                temperature REAL,
+                consciousness TEXT,
+                on_oxygen INTEGER,
+                risk_level TEXT NOT NULL,
+                risk_score REAL,
+                notes TEXT,
+                assessed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (patient_id) REFERENCES users(id)
+            )
+        """)
+
+        # Doctor notes table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS doctor_notes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doctor_id INTEGER NOT NULL,
+                patient_id INTEGER NOT NULL,
+                note TEXT NOT NULL,
+                is_critical INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (doctor_id) REFERENCES users(id),
+                FOREIGN KEY (patient_id) REFERENCES users(id)
+            )
+        """)
+
+        # Login logs table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS login_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                ip_address TEXT DEFAULT 'localhost',
+                logged_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user_id) REFERENCES users(id)
+            )
+        """)
+
+        # Indexes for the per-patient history, doctor panel and role-filtered queries
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_assess_patient_time ON assessments(patient_id, assessed_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notes_patient_time ON doctor_notes(patient_id, created_at DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_assess_risk ON assessments(risk_level)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_login_time ON login_logs(logged_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_doctor ON patients(assigned_doctor_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_role_active ON users(role, is_active)")
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 
 # ── USER OPERATIONS ──────────────────────────────────────────
 
 def create_user(username, password_hash, full_name, email, role):
-    """Insert a new user into the database."""
-    conn = get_connection()
+    """Insert a new user into the database. Returns (success, message, user_id)."""
     try:
-        conn.execute("""
-            INSERT INTO users (username, password_hash, full_name, email, role)
-            VALUES (?, ?, ?, ?, ?)
-        """, (username, password_hash, full_name, email, role))
-        user_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
-        if role == 'patient':
-            conn.execute("INSERT INTO patients (user_id) VALUES (?)", (user_id,))
-        conn.commit()
-        return True, "User created successfully"
+        with transaction() as conn:
+            user_id = conn.execute("""
+                INSERT INTO users (username, password_hash, full_name, email, role)
+                VALUES (?, ?, ?, ?, ?)
+            """, (username, password_hash, full_name, email, role)).lastrowid
+            if role == 'patient':
+                conn.execute("INSERT INTO patients (user_id) VALUES (?)", (user_id,))
+        return True, "User created successfully", user_id
     except sqlite3.IntegrityError as e:
         if "username" in str(e):
-            return False, "Username already exists"
+            return False, "Username already exists", None
         elif "email" in str(e):
-            return False, "Email already exists"
-        return False, str(e)
-    finally:
-        conn.close()
+            return False, "Email already exists", None
+        return False, str(e), None
 
 
 def get_user_by_username(username):
     """Fetch a user by username."""
-    conn = get_connection()
-    user = conn.execute(
-        "SELECT * FROM users WHERE username = ? AND is_active = 1", (username,)
-    ).fetchone()
-    conn.close()
-    return dict(user) if user else None
+    with pooled_connection() as conn:
+        return _fetch_dict(conn.execute(
+            "SELECT * FROM users WHERE username = ? AND is_active = 1", (username,)
+        ))
 
 
 def get_user_by_id(user_id):
     """Fetch a user by ID."""
-    conn = get_connection()
-    user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
-    conn.close()
-    return dict(user) if user else None
+    with pooled_connection() as conn:
+        return _fetch_dict(conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)))
 
 
 def log_login(user_id, action):
-    """Log a login or logout event."""
-    conn = get_connection()
-    conn.execute(
-        "INSERT INTO login_logs (user_id, action) VALUES (?, ?)", (user_id, action)
-    )
-    conn.commit()
-    conn.close()
+    """Queue a login or logout event; the background flusher writes it in a batch."""
+    _start_login_flusher()
+    _login_queue.put((user_id, action, time.time()))
+
+
+def log_logins_bulk(events):
+    """Insert many (user_id, action, unix_timestamp) login events in one transaction."""
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO login_logs (user_id, action, logged_at) VALUES (?, ?, datetime(?, 'unixepoch'))",
+            events
+        )
+
+
+def _write_login_events(events):
+    """Write a batch of login events, dropping (and logging) any row that violates a constraint.
+
+    A constraint failure aborts the whole executemany, so the batch is retried
+    row by row in one transaction, each row in its own savepoint. Lock and busy
+    errors (OperationalError) propagate with nothing written, so the caller
+    can safely retry the whole batch.
+    """
+    try:
+        log_logins_bulk(events)
+    except sqlite3.IntegrityError:
+        with transaction():
+            for event in events:
+                try:
+                    log_logins_bulk([event])
+                except sqlite3.IntegrityError as e:
+                    logger.error("Dropping login event %r: %s", event, e)
+
+
+def _drain_login_queue():
+    """Write every queued login event that is immediately available."""
+    batch = []
+    while True:
+        try:
+            batch.append(_login_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        try:
+            _write_login_events(batch)
+        except sqlite3.Error:
+            logger.exception("Failed to write %d login events at shutdown", len(batch))
+
+
+def _login_flusher():
+    """Block for the next event, gather up to LOG_FLUSH_BATCH more within LOG_FLUSH_INTERVAL, write them.
+
+    A locked or busy database puts the batch back on the queue and backs off,
+    so audit events survive contention and are still drained at exit. Rows
+    that can never be written are dropped by _write_login_events.
+    """
+    delay = LOG_FLUSH_INTERVAL
+    while True:
+        batch = [_login_queue.get()]
+        deadline = time.monotonic() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_FLUSH_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_login_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        try:
+            _write_login_events(batch)
+        except sqlite3.OperationalError:
+            logger.exception("Failed to write %d login events; retrying in %.1fs", len(batch), delay)
+            for event in batch:
+                _login_queue.put(event)
+            time.sleep(delay)
+            delay = min(delay * 2, LOG_RETRY_MAX_DELAY)
+            continue
+        except sqlite3.Error:
+            logger.exception("Dropping %d login events that cannot be written", len(batch))
+        delay = LOG_FLUSH_INTERVAL
+
+
+def _start_login_flusher():
+    """Start the login flusher thread once per process."""
+    global _flusher_thread
+    if _flusher_thread is not None:
+        return
+    with _flusher_lock:
+        if _flusher_thread is None:
+            thread = threading.Thread(target=_login_flusher, name="login-log-flusher", daemon=True)
+            thread.start()
+            _flusher_thread = thread
+
+
+atexit.register(_drain_login_queue)
 
 
 # ── ASSESSMENT OPERATIONS ─────────────────────────────────────
 
-def save_assessment(patient_id, vitals, risk_level, risk_score, notes=""):
-    """Save a new assessment record."""
-    conn = get_connection()
-    conn.execute("""
-        INSERT INTO assessments 
-        (patient_id, respiratory_rate, oxygen_saturation, o2_scale, systolic_bp,
-         heart_rate, temperature, consciousness, on_oxygen, risk_level, risk_score, notes)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+_INSERT_ASSESSMENT = """
+    INSERT INTO assessments 
+    (patient_id, respiratory_rate, oxygen_saturation, o2_scale, systolic_bp,
+     heart_rate, temperature, consciousness, on_oxygen, risk_level, risk_score, notes)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_INSERT_NOTE = """
+    INSERT INTO doctor_notes (doctor_id, patient_id, note, is_critical)
+    VALUES (?, ?, ?, ?)
+"""
+
+
+def _assessment_params(patient_id, vitals, risk_level, risk_score, notes=""):
+    """Flatten save_assessment arguments into an _INSERT_ASSESSMENT parameter tuple."""
+    return (
         patient_id,
         vitals['respiratory_rate'], vitals['oxygen_saturation'],
         vitals['o2_scale'], vitals['systolic_bp'], vitals['heart_rate'],
         vitals['temperature'], vitals['consciousness'],
         vitals['on_oxygen'], risk_level, risk_score, notes
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+
+def _note_params(doctor_id, patient_id, note, is_critical=False):
+    """Flatten add_doctor_note arguments into an _INSERT_NOTE parameter tuple."""
+    return (doctor_id, patient_id, note, int(is_critical))
 
 
-def get_patient_assessments(patient_id):
-    """Get all assessments for a patient."""
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT * FROM assessments WHERE patient_id = ? ORDER BY assessed_at DESC
-    """, (patient_id,)).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+def _executemany_chunked(sql, params):
+    """Run executemany over params in BULK_CHUNK slices, all inside one transaction."""
+    params = iter(params)
+    with transaction() as conn:
+        while True:
+            chunk = list(islice(params, BULK_CHUNK))
+            if not chunk:
+                break
+            conn.executemany(sql, chunk)
+
+
+def save_assessment(patient_id, vitals, risk_level, risk_score, notes=""):
+    """Save a new assessment record."""
+    with pooled_connection() as conn:
+        conn.execute(
+            _INSERT_ASSESSMENT, _assessment_params(patient_id, vitals, risk_level, risk_score, notes))
+
+
+def save_assessments_bulk(rows):
+    """Save many assessments in one transaction.
+
+    Each row is a tuple of save_assessment arguments:
+    (patient_id, vitals, risk_level, risk_score[, notes]).
+    """
+    _executemany_chunked(_INSERT_ASSESSMENT, (_assessment_params(*row) for row in rows))
+
+
+def get_patient_assessments(patient_id, limit=None):
+    """Get a patient's assessments, newest first (all of them unless limit is given)."""
+    with pooled_connection() as conn:
+        return _fetch_dicts(conn.execute("""
+            SELECT * FROM assessments WHERE patient_id = ? ORDER BY assessed_at DESC LIMIT ?
+        """, (patient_id, -1 if limit is None else limit)))
+
+
+def get_patient_summary(patient_id):
+    """Get assessment totals and the latest assessment for a patient's dashboard."""
+    with pooled_connection() as conn:
+        total, high_count = conn.execute("""
+            SELECT COUNT(*), COUNT(*) FILTER (WHERE risk_level = 'High')
+            FROM assessments WHERE patient_id = ?
+        """, (patient_id,)).fetchone()
+        latest = _fetch_dict(conn.execute("""
+            SELECT * FROM assessments WHERE patient_id = ? ORDER BY assessed_at DESC LIMIT 1
+        """, (patient_id,)))
+        return {
+            'total': total,
+            'high_count': high_count,
+            'latest': latest,
+        }
+
+
+def _group_by_patient(rows):
+    """Group rows (already ordered newest first) into {patient_id: [row, ...]}."""
+    grouped = {}
+    for row in rows:
+        row.pop('rn', None)
+        grouped.setdefault(row['patient_id'], []).append(row)
+    return grouped
+
+
+def get_assessments_for(patient_ids, limit_per=None):
+    """Get assessments for several patients in one query, keyed by patient id.
+
+    With limit_per, only the newest limit_per rows of each patient are returned.
+    """
+    patient_ids = list(patient_ids)
+    if not patient_ids:
+        return {}
+    placeholders = ",".join("?" * len(patient_ids))
+    with pooled_connection() as conn:
+        if limit_per is None:
+            cursor = conn.execute(f"""
+                SELECT * FROM assessments WHERE patient_id IN ({placeholders})
+                ORDER BY patient_id, assessed_at DESC
+            """, patient_ids)
+        else:
+            cursor = conn.execute(f"""
+                SELECT * FROM (
+                    SELECT a.*, ROW_NUMBER() OVER (
+                        PARTITION BY a.patient_id ORDER BY a.assessed_at DESC) AS rn
+                    FROM assessments a
+                    WHERE a.patient_id IN ({placeholders})
+                )
+                WHERE rn <= ?
+                ORDER BY patient_id, rn
+            """, [*patient_ids, limit_per])
+        return _group_by_patient(_fetch_dicts(cursor))
+
+
+# Latest risk and assessment count per patient row u. Each subquery is a
+# search on idx_assess_patient_time (the count is index-only), which EXPLAIN
+# QUERY PLAN shows beats windowing over the whole assessments table.
+_PATIENT_RISK_COLUMNS = """
+    (SELECT risk_level FROM assessments WHERE patient_id = u.id
+     ORDER BY assessed_at DESC LIMIT 1) as latest_risk,
+    (SELECT COUNT(*) FROM assessments WHERE patient_id = u.id) as total_assessments
+"""
 
 
 def get_all_patients():
     """Get all patients with their user info."""
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT u.id, u.full_name, u.email, u.created_at, p.status, p.gender,
-               p.assigned_doctor_id,
-               (SELECT risk_level FROM assessments WHERE patient_id = u.id 
-                ORDER BY assessed_at DESC LIMIT 1) as latest_risk,
-               (SELECT COUNT(*) FROM assessments WHERE patient_id = u.id) as total_assessments
-        FROM users u
-        JOIN patients p ON u.id = p.user_id
-        WHERE u.role = 'patient' AND u.is_active = 1
-    """).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    with pooled_connection() as conn:
+        return _fetch_dicts(conn.execute(f"""
+            SELECT u.id, u.full_name, u.email, u.created_at, p.status, p.gender,
+                   p.assigned_doctor_id, {_PATIENT_RISK_COLUMNS}
+            FROM users u
+            JOIN patients p ON u.id = p.user_id
+            WHERE u.role = 'patient' AND u.is_active = 1
+        """))
+
+
+def get_patient_registry():
+    """Get the admin patient registry as a DataFrame, projected and joined in SQL."""
+    import pandas as pd
+    with pooled_connection() as conn:
+        return pd.read_sql_query(f"""
+            SELECT u.id, u.full_name, u.email, {_PATIENT_RISK_COLUMNS},
+                   COALESCE(d.full_name, 'Unassigned') as assigned_doctor,
+                   p.status, u.created_at
+            FROM users u
+            JOIN patients p ON u.id = p.user_id
+            LEFT JOIN users d ON d.id = p.assigned_doctor_id
+            WHERE u.role = 'patient' AND u.is_active = 1
+        """, conn)
 
 
 def get_doctor_patients(doctor_id):
     """Get all patients assigned to a specific doctor."""
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT u.id, u.full_name, u.email, u.created_at, p.status, p.gender,
-               (SELECT risk_level FROM assessments WHERE patient_id = u.id 
-                ORDER BY assessed_at DESC LIMIT 1) as latest_risk,
-               (SELECT COUNT(*) FROM assessments WHERE patient_id = u.id) as total_assessments
-        FROM users u
-        JOIN patients p ON u.id = p.user_id
-        WHERE u.role = 'patient' AND p.assigned_doctor_id = ? AND u.is_active = 1
-    """, (doctor_id,)).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    with pooled_connection() as conn:
+        return _fetch_dicts(conn.execute(f"""
+            SELECT u.id, u.full_name, u.email, u.created_at, p.status, p.gender,
+                   {_PATIENT_RISK_COLUMNS}
+            FROM users u
+            JOIN patients p ON u.id = p.user_id
+            WHERE u.role = 'patient' AND p.assigned_doctor_id = ? AND u.is_active = 1
+        """, (doctor_id,)))
 
 
 # ── DOCTOR NOTES ──────────────────────────────────────────────
 
 def add_doctor_note(doctor_id, patient_id, note, is_critical=False):
     """Add a doctor's note for a patient."""
-    conn = get_connection()
-    conn.execute("""
-        INSERT INTO doctor_notes (doctor_id, patient_id, note, is_critical)
-        VALUES (?, ?, ?, ?)
-    """, (doctor_id, patient_id, note, int(is_critical)))
-    conn.commit()
-    conn.close()
+    with pooled_connection() as conn:
+        conn.execute(_INSERT_NOTE, _note_params(doctor_id, patient_id, note, is_critical))
+
+
+def add_doctor_notes_bulk(rows):
+    """Add many (doctor_id, patient_id, note[, is_critical]) notes in one transaction."""
+    _executemany_chunked(_INSERT_NOTE, (_note_params(*row) for row in rows))
 
 
 def get_patient_notes(patient_id):
     """Get all notes for a patient."""
-    conn = get_connection()
-    rows = conn.execute("""
-        SELECT dn.*, u.full_name as doctor_name
-        FROM doctor_notes dn
-        JOIN users u ON dn.doctor_id = u.id
-        WHERE dn.patient_id = ?
-        ORDER BY dn.created_at DESC
-    """, (patient_id,)).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    with pooled_connection() as conn:
+        return _fetch_dicts(conn.execute("""
+            SELECT dn.*, u.full_name as doctor_name
+            FROM doctor_notes dn
+            JOIN users u ON dn.doctor_id = u.id
+            WHERE dn.patient_id = ?
+            ORDER BY dn.created_at DESC
+        """, (patient_id,)))
+
+
+def get_notes_for(patient_ids, limit_per=3):
+    """Get the newest limit_per notes for several patients in one query, keyed by patient id."""
+    patient_ids = list(patient_ids)
+    if not patient_ids:
+        return {}
+    placeholders = ",".join("?" * len(patient_ids))
+    with pooled_connection() as conn:
+        rows = _fetch_dicts(conn.execute(f"""
+            SELECT * FROM (
+                SELECT dn.*, u.full_name as doctor_name, ROW_NUMBER() OVER (
+                    PARTITION BY dn.patient_id ORDER BY dn.created_at DESC) AS rn
+                FROM doctor_notes dn
+                JOIN users u ON dn.doctor_id = u.id
+                WHERE dn.patient_id IN ({placeholders})
+            )
+            WHERE rn <= ?
+            ORDER BY patient_id, rn
+        """, [*patient_ids, limit_per]))
+        return _group_by_patient(rows)
 
 
 def assign_patient_to_doctor(patient_id, doctor_id):
     """Assign a patient to a doctor."""
-    conn = get_connection()
-    conn.execute(
-        "UPDATE patients SET assigned_doctor_id = ? WHERE user_id = ?",
-        (doctor_id, patient_id)
-    )
-    conn.commit()
-    conn.close()
+    with pooled_connection() as conn:
+        conn.execute(
+            "UPDATE patients SET assigned_doctor_id = ? WHERE user_id = ?",
+            (doctor_id, patient_id)
+        )
 
 
 # ── ADMIN ANALYTICS ───────────────────────────────────────────
 
 def get_system_stats():
     """Get overall system statistics for admin dashboard."""
-    conn = get_connection()
-    stats = {}
-    stats['total_patients'] = conn.execute(
-        "SELECT COUNT(*) FROM users WHERE role='patient'"
-    ).fetchone()[0]
-    stats['total_doctors'] = conn.execute(
-        "SELECT COUNT(*) FROM users WHERE role='doctor'"
-    ).fetchone()[0]
-    stats['total_assessments'] = conn.execute(
-        "SELECT COUNT(*) FROM assessments"
-    ).fetchone()[0]
-    stats['high_risk_count'] = conn.execute(
-        "SELECT COUNT(*) FROM assessments WHERE risk_level='High'"
-    ).fetchone()[0]
-    stats['medium_risk_count'] = conn.execute(
-        "SELECT COUNT(*) FROM assessments WHERE risk_level='Medium'"
-    ).fetchone()[0]
-    stats['low_risk_count'] = conn.execute(
-        "SELECT COUNT(*) FROM assessments WHERE risk_level='Low'"
-    ).fetchone()[0]
-    stats['recent_logins'] = conn.execute(
-        "SELECT COUNT(*) FROM login_logs WHERE logged_at >= datetime('now', '-1 day')"
-    ).fetchone()[0]
-    conn.close()
-    return stats
+    with pooled_connection() as conn:
+        roles = dict(conn.execute(
+            "SELECT role, COUNT(*) FROM users GROUP BY role"
+        ).fetchall())
+        total, high, medium, low = conn.execute("""
+            SELECT COUNT(*),
+                   COALESCE(SUM(risk_level = 'High'), 0),
+                   COALESCE(SUM(risk_level = 'Medium'), 0),
+                   COALESCE(SUM(risk_level = 'Low'), 0)
+            FROM assessments
+        """).fetchone()
+        recent_logins = conn.execute(
+            "SELECT COUNT(*) FROM login_logs WHERE logged_at >= datetime('now', '-1 day')"
+        ).fetchone()[0]
+        return {
+            'total_patients': roles.get('patient', 0),
+            'total_doctors': roles.get('doctor', 0),
+            'total_assessments': total,
+            'high_risk_count': high,
+            'medium_risk_count': medium,
+            'low_risk_count': low,
+            'recent_logins': recent_logins,
+        }
 
 
 def get_all_doctors():
     """Get all doctors."""
-    conn = get_connection()
-    rows = conn.execute(
-        "SELECT id, full_name, email FROM users WHERE role='doctor' AND is_active=1"
-    ).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    with pooled_connection() as conn:
+        return _fetch_dicts(conn.execute(
+            "SELECT id, full_name, email FROM users WHERE role='doctor' AND is_active=1"
+        ))
@@ -0,0 +1,30 @@
+"""
+fastpath.py - Numba-compiled kernels for batch vitals scoring
+Falls back to plain Python when numba is not installed
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba is optional; fall back to plain Python
+    def njit(*args, **kwargs):
+        return lambda fn: fn
+
+
+# fastmath is left off: missing vitals arrive as NaN and must compare False
+@njit(cache=True)
+def classify_vitals(vals, lo, hi):
+    """
+    Classify an (N, 5) array of vitals against per-column lo/hi bounds.
+    Returns: (N, 5) int8 array, -1 low / 0 normal / +1 high (NaN = normal).
+    """
+    out = np.zeros(vals.shape, np.int8)
+    for i in range(vals.shape[0]):
+        for j in range(vals.shape[1]):
+            v = vals[i, j]
+            if v < lo[j]:
+                out[i, j] = -1
+            elif v > hi[j]:
+                out[i, j] = 1
+    return out
@@ -3,11 +3,16 @@ model.py - ML model loading and risk prediction
 Handles loading the trained MLP model and making predictions
 """
 
+import functools
 import numpy as np
 import pickle
 import os
+import re
+import threading
 import streamlit as st
 
+import fastpath
+
 
 # ── NORMAL RANGES FOR VITAL SIGNS ────────────────────────────
 VITAL_RANGES = {
@@ -19,50 +24,121 @@ VITAL_RANGES = {
     'temperature': {'min': 36.1, 'max': 37.5, 'unit': '°C', 'label': 'Temperature'},
 }
 
+# Vitals screened by check_abnormal_vitals, in classify_vitals column order
+_ABNORMAL_KEYS = ('respiratory_rate', 'oxygen_saturation', 'systolic_bp', 'heart_rate', 'temperature')
+_ABNORMAL_LOW = np.array([VITAL_RANGES[k]['min'] for k in _ABNORMAL_KEYS], dtype=np.float64)
+_ABNORMAL_HIGH = np.array([VITAL_RANGES[k]['max'] for k in _ABNORMAL_KEYS], dtype=np.float64)
+_ABNORMAL_NORMAL = tuple(f"{VITAL_RANGES[k]['min']}-{VITAL_RANGES[k]['max']}" for k in _ABNORMAL_KEYS)
+
+# Numerical model inputs, in scaler column order; consciousness and on_oxygen follow
+_MODEL_NUMERICAL = ('respiratory_rate', 'oxygen_saturation', 'o2_scale',
+                    'systolic_bp', 'heart_rate', 'temperature')
+# Every vital that affects a prediction, in cache-key order
+_PREDICT_KEYS = _MODEL_NUMERICAL + ('consciousness', 'on_oxygen')
+
 RISK_LABELS = {0: 'Low', 1: 'Medium', 2: 'High'}
 RISK_COLORS = {'Low': '#2ecc71', 'Medium': '#f39c12', 'High': '#e74c3c'}
 
-RECOMMENDATIONS = {
+# Recommendation icon and plain text; the app shows both, the PDF report only the text
+RECOMMENDATION_ITEMS = {
     'Low': [
-        "✅ Your vitals are within normal range.",
-        "🥗 Maintain a balanced diet and regular exercise.",
-        "💧 Stay hydrated and get adequate sleep (7-9 hours).",
-        "🏃 Engage in at least 30 minutes of physical activity daily.",
-        "📅 Schedule routine check-ups every 6-12 months.",
-        "🚭 Avoid smoking and limit alcohol consumption.",
+        ('✅', 'Your vitals are within normal range.'),
+        ('🥗', 'Maintain a balanced diet and regular exercise.'),
+        ('💧', 'Stay hydrated and get adequate sleep (7-9 hours).'),
+        ('🏃', 'Engage in at least 30 minutes of physical activity daily.'),
+        ('📅', 'Schedule routine check-ups every 6-12 months.'),
+        ('🚭', 'Avoid smoking and limit alcohol consumption.'),
     ],
     'Medium': [
-        "⚠️ Some vitals are outside the normal range.",
-        "👨‍⚕️ Consult a doctor within the next 24-48 hours.",
-        "📊 Monitor your vitals daily and track any changes.",
-        "💊 Take prescribed medications as directed.",
-        "🧘 Reduce stress through relaxation techniques.",
-        "🍎 Follow a heart-healthy diet and reduce sodium intake.",
-        "📞 Contact your healthcare provider if symptoms worsen.",
+        ('⚠️', 'Some vitals are outside the normal range.'),
+        ('👨\u200d⚕️', 'Consult a doctor within the next 24-48 hours.'),
+        ('📊', 'Monitor your vitals daily and track any changes.'),
+        ('💊', 'Take prescribed medications as directed.'),
+        ('🧘', 'Reduce stress through relaxation techniques.'),
+        ('🍎', 'Follow a heart-healthy diet and reduce sodium intake.'),
+        ('📞', 'Contact your healthcare provider if symptoms worsen.'),
     ],
     'High': [
-        "🚨 URGENT: Seek immediate medical attention!",
-        "🏥 Go to the nearest emergency room or call emergency services.",
-        "📱 Call emergency services (911 or local emergency number) immediately.",
-        "🚫 Do NOT drive yourself to the hospital.",
-        "👥 Have someone stay with you at all times.",
-        "💊 Do not take any new medications without doctor approval.",
-        "📋 Bring a list of your current medications to the hospital.",
-    ]
+        ('🚨', 'URGENT: Seek immediate medical attention!'),
+        ('🏥', 'Go to the nearest emergency room or call emergency services.'),
+        ('📱', 'Call emergency services (911 or local emergency number) immediately.'),
+        ('🚫', 'Do NOT drive yourself to the hospital.'),
+        ('👥', 'Have someone stay with you at all times.'),
+        ('💊', 'Do not take any new medications without doctor approval.'),
+        ('📋', 'Bring a list of your current medications to the hospital.'),
+    ],
+}
+
+RECOMMENDATIONS = {
+    level: [f"{icon} {text}" for icon, text in items]
+    for level, items in RECOMMENDATION_ITEMS.items()
 }
+CLEAN_RECOMMENDATIONS = {
+    level: [text for _, text in items]
+    for level, items in RECOMMENDATION_ITEMS.items()
+}
+
+
+# ── EMOJI STRIPPING ──────────────────────────────────────────
+# Fallback for recommendation text that doesn't come from RECOMMENDATION_ITEMS;
+# the PDF report's built-in fonts can't render emoji
+_EMOJI = ['✅','⚠️','🚨','🏥','👨\u200d⚕️','📊','💊','🧘','🍎','📞',
+          '🚫','👥','📱','📋','🥗','💧','🏃','📅','🚭','✓','🟢','🟡','🔴']
+_EMOJI_RE = re.compile('|'.join(re.escape(e) for e in sorted(_EMOJI, key=len, reverse=True)))
+
+
+def strip_emoji(text):
+    """Remove the recommendation emoji from text in a single regex pass."""
+    return _EMOJI_RE.sub('', text).strip()
+
+
+class _TFLiteModel:
+    """TFLite interpreter exposed as a callable mapping a (1, 8) input row to class probabilities."""
+
+    def __init__(self, path):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self._interpreter = Interpreter(model_path=path)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]['index']
+        self._output = self._interpreter.get_output_details()[0]['index']
+        # One interpreter is shared by every session and is not thread-safe
+        self._lock = threading.Lock()
+
+    def __call__(self, x):
+        with self._lock:
+            self._interpreter.set_tensor(self._input, x)
+            self._interpreter.invoke()
+            return self._interpreter.get_tensor(self._output)[0].copy()
 
 
 @st.cache_resource
 def load_model_and_scaler():
-    """Load the trained model and scaler. Returns None if files not found."""
+    """Load the trained model and scaler. Returns None if files not found.
+
+    The model is returned as a callable mapping a (1, 8) float32 row to class
+    probabilities. A converted risk_model.tflite is preferred over the Keras
+    model; it has the scaler folded in, so the scaler is None on that path.
+    """
     model = None
     scaler = None
 
-    # Try loading Keras model
+    # Try loading the TFLite model (see convert_model.py)
+    try:
+        if os.path.exists('risk_model.tflite'):
+            return _TFLiteModel('risk_model.tflite'), None
+    except Exception as e:
+        pass
+
+    # Fall back to the Keras model
     try:
         from tensorflow.keras.models import load_model
         if os.path.exists('risk_model.h5'):
-            model = load_model('risk_model.h5')
+            keras_model = load_model('risk_model.h5')
+            model = lambda x: keras_model(x, training=False).numpy()[0]
     except Exception as e:
         pass
 
@@ -74,6 +150,9 @@ def load_model_and_scaler():
     except Exception as e:
         pass
 
+    # The Keras model expects scaled input, so it is unusable without the scaler
+    if scaler is None:
+        return None, None
     return model, scaler
 
 
@@ -83,9 +162,18 @@ def predict_risk(vitals: dict):
     Falls back to rule-based if model not available.
     Returns: (risk_label, risk_score, probabilities)
     """
+    risk_label, risk_score, probs = _predict_cached(tuple(vitals[k] for k in _PREDICT_KEYS))
+    # Copy so callers can't mutate the cached probabilities
+    return risk_label, risk_score, dict(probs)
+
+
+@functools.lru_cache(maxsize=1024)
+def _predict_cached(values):
+    """predict_risk memoized on the vitals values in _PREDICT_KEYS order."""
+    vitals = dict(zip(_PREDICT_KEYS, values))
     model, scaler = load_model_and_scaler()
 
-    if model is not None and scaler is not None:
+    if model is not None:
         return _model_predict(vitals, model, scaler)
     else:
         return _rule_based_predict(vitals)
@@ -94,28 +182,18 @@ def predict_risk(vitals: dict):
 def _model_predict(vitals, model, scaler):
     """Use the trained MLP model for prediction."""
     try:
-        import numpy as np
-
-        numerical_input = np.array([[
-            vitals['respiratory_rate'],
-            vitals['oxygen_saturation'],
-            vitals['o2_scale'],
-            vitals['systolic_bp'],
-            vitals['heart_rate'],
-            vitals['temperature']
-        ]])
-
-        numerical_scaled = scaler.transform(numerical_input)
-        consciousness_encoded = 1 if vitals['consciousness'] != 'A' else 0
-        final_input = np.concatenate([
-            numerical_scaled,
-            [[consciousness_encoded, vitals['on_oxygen']]]
-        ], axis=1)
-
-        probs = model.predict(final_input, verbose=0)[0]
-        pred_class = int(np.argmax(probs))
+        # Per-call buffer: Streamlit sessions predict concurrently, so it can't be shared
+        x = np.empty((1, 8), dtype=np.float32)
+        x[0, :6] = [vitals[k] for k in _MODEL_NUMERICAL]
+        if scaler is not None:
+            x[:, :6] = scaler.transform(x[:, :6])
+        x[0, 6] = vitals['consciousness'] != 'A'
+        x[0, 7] = vitals['on_oxygen']
+
+        probs = model(x)
+        pred_class = int(probs.argmax())
         risk_label = RISK_LABELS[pred_class]
-        risk_score = float(np.max(probs)) * 100
+        risk_score = float(probs[pred_class]) * 100
 
         return risk_label, risk_score, {
             'Low': float(probs[0]) * 100,
@@ -174,19 +252,57 @@ def _rule_based_predict(vitals):
     return risk_label, risk_score, probs
 
 
+def _rule_based_predict_batch(vitals):
+    """
+    Vectorized _rule_based_predict for scoring many rows at once.
+    vitals: DataFrame (or dict of arrays) keyed like a single vitals dict.
+    Returns: (risk_labels, risk_scores) as NumPy arrays.
+    """
+    rr = np.asarray(vitals['respiratory_rate'], dtype=np.float64)
+    spo2 = np.asarray(vitals['oxygen_saturation'], dtype=np.float64)
+    sbp = np.asarray(vitals['systolic_bp'], dtype=np.float64)
+    hr = np.asarray(vitals['heart_rate'], dtype=np.float64)
+    temp = np.asarray(vitals['temperature'], dtype=np.float64)
+    consciousness = np.asarray(vitals['consciousness'])
+    on_oxygen = np.asarray(vitals['on_oxygen'])
+
+    score = (
+        np.where((rr < 12) | (rr > 25), 3, np.where(rr > 20, 1, 0))
+        + np.where(spo2 < 90, 4, np.where(spo2 < 94, 2, 0))
+        + np.where((sbp < 90) | (sbp > 180), 3, np.where((sbp > 160) | (sbp < 100), 1, 0))
+        + np.where((hr < 40) | (hr > 130), 3, np.where((hr > 100) | (hr < 60), 1, 0))
+        + np.where((temp < 35) | (temp > 39.5), 3, np.where((temp > 38) | (temp < 36), 1, 0))
+        + np.select([consciousness == 'U', consciousness == 'P', consciousness == 'V'], [5, 3, 1], 0)
+        + (on_oxygen == 1)
+    )
+
+    conditions = [score >= 8, score >= 4]
+    risk_labels = np.select(conditions, ['High', 'Medium'], default='Low')
+    risk_scores = np.select(conditions, [80.0, 65.0], default=80.0)
+    return risk_labels, risk_scores
+
+
+def classify_vitals(values):
+    """
+    Classify vitals against their normal ranges with the compiled batch kernel.
+    values: array of shape (5,) or (N, 5) in _ABNORMAL_KEYS order (NaN = missing).
+    Returns: int8 array of the same shape, -1 low / 0 normal / +1 high.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        return fastpath.classify_vitals(values[np.newaxis, :], _ABNORMAL_LOW, _ABNORMAL_HIGH)[0]
+    return fastpath.classify_vitals(values, _ABNORMAL_LOW, _ABNORMAL_HIGH)
+
+
 def check_abnormal_vitals(vitals: dict) -> dict:
     """Check which vitals are outside normal range."""
+    status = classify_vitals([vitals.get(k, np.nan) for k in _ABNORMAL_KEYS])
     abnormal = {}
-    checks = {
-        'respiratory_rate': (vitals['respiratory_rate'], 12, 20),
-        'oxygen_saturation': (vitals['oxygen_saturation'], 95, 100),
-        'systolic_bp': (vitals['systolic_bp'], 90, 140),
-        'heart_rate': (vitals['heart_rate'], 60, 100),
-        'temperature': (vitals['temperature'], 36.1, 37.5),
-    }
-    for key, (value, low, high) in checks.items():
-        if value < low:
-            abnormal[key] = {'value': value, 'status': 'low', 'normal': f"{low}-{high}"}
-        elif value > high:
-            abnormal[key] = {'value': value, 'status': 'high', 'normal': f"{low}-{high}"}
+    for i in np.flatnonzero(status):
+        key = _ABNORMAL_KEYS[i]
+        abnormal[key] = {
+            'value': vitals[key],
+            'status': 'low' if status[i] < 0 else 'high',
+            'normal': _ABNORMAL_NORMAL[i],
+        }
     return abnormal
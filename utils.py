@@ -3,163 +3,52 @@ utils.py - Utility functions and UI helpers
 Shared helper functions for visualizations, formatting, and UI components
 """
 
+import copy
+import functools
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
-import pandas as pd
+from collections import Counter
 from datetime import datetime
+from pathlib import Path
 from model import RISK_COLORS, VITAL_RANGES
 
+THEME_CSS_PATH = Path(__file__).parent / "assets" / "theme.css"
+
+# Display label and unit per vital, resolved once from VITAL_RANGES
+_VITAL_META = {k: (v.get('label', k), v.get('unit', '')) for k, v in VITAL_RANGES.items()}
+
+
+@st.cache_data(show_spinner=False)
+def _theme_css():
+    """The hospital-style theme stylesheet, read from disk once per process."""
+    return THEME_CSS_PATH.read_text(encoding="utf-8")
+
+
+def cache_figure(**cache_kwargs):
+    """st.cache_data for a Plotly figure builder that caches the figure's dict, not the Figure.
+
+    Unpickling a cached go.Figure re-runs plotly's validators, costing as much
+    as building it again; the validated dict unpickles cheaply and is wrapped
+    back into a Figure without validation. The builder may return None.
+    """
+    def decorator(build):
+        @st.cache_data(**cache_kwargs)
+        @functools.wraps(build)
+        def cached_spec(*args):
+            fig = build(*args)
+            return None if fig is None else fig.to_dict()
+
+        @functools.wraps(build)
+        def render(*args):
+            import plotly.graph_objects as go
+            spec = cached_spec(*args)
+            return None if spec is None else go.Figure(spec, _validate=False)
+        return render
+    return decorator
+
 
 def apply_theme():
     """Apply the hospital-style CSS theme."""
-    st.markdown("""
-    <style>
-    @import url('https://fonts.googleapis.com/css2?family=DM+Sans:wght@300;400;500;600;700&family=DM+Serif+Display&display=swap');
-
-    :root {
-        --primary: #1a4a7a;
-        --primary-light: #2563a8;
-        --accent: #00b4d8;
-        --success: #2ecc71;
-        --warning: #f39c12;
-        --danger: #e74c3c;
-        --bg: #f0f4f8;
-        --card-bg: #ffffff;
-        --text: #1e293b;
-        --text-muted: #64748b;
-        --border: #e2e8f0;
-        --sidebar-bg: #1a4a7a;
-    }
-
-    html, body, [class*="css"] {
-        font-family: 'DM Sans', sans-serif;
-        color: var(--text);
-    }
-
-    .stApp { background-color: var(--bg); }
-
-    /* Sidebar */
-    section[data-testid="stSidebar"] {
-        background: linear-gradient(180deg, #1a4a7a 0%, #0f2d4f 100%);
-    }
-    section[data-testid="stSidebar"] * { color: white !important; }
-    section[data-testid="stSidebar"] .stSelectbox label { color: rgba(255,255,255,0.7) !important; }
-
-    /* Cards */
-    .metric-card {
-        background: white;
-        border-radius: 16px;
-        padding: 24px;
-        box-shadow: 0 2px 12px rgba(0,0,0,0.06);
-        border-left: 4px solid var(--primary);
-        margin-bottom: 16px;
-        transition: transform 0.2s, box-shadow 0.2s;
-    }
-    .metric-card:hover { transform: translateY(-2px); box-shadow: 0 8px 24px rgba(0,0,0,0.1); }
-    .metric-card.success { border-left-color: var(--success); }
-    .metric-card.warning { border-left-color: var(--warning); }
-    .metric-card.danger  { border-left-color: var(--danger); }
-
-    /* Risk badge */
-    .risk-badge {
-        display: inline-block;
-        padding: 8px 20px;
-        border-radius: 50px;
-        font-weight: 700;
-        font-size: 1rem;
-        letter-spacing: 0.5px;
-    }
-    .risk-low    { background: #d1fae5; color: #065f46; }
-    .risk-medium { background: #fef3c7; color: #92400e; }
-    .risk-high   { background: #fee2e2; color: #991b1b; }
-
-    /* Section headers */
-    .section-title {
-        font-family: 'DM Serif Display', serif;
-        font-size: 1.6rem;
-        color: var(--primary);
-        margin-bottom: 20px;
-        padding-bottom: 10px;
-        border-bottom: 2px solid var(--border);
-    }
-
-    /* Alert boxes */
-    .alert-high {
-        background: #fee2e2;
-        border: 1px solid #fca5a5;
-        border-radius: 12px;
-        padding: 16px;
-        margin: 12px 0;
-        color: #991b1b;
-        font-weight: 500;
-    }
-    .alert-medium {
-        background: #fef3c7;
-        border: 1px solid #fcd34d;
-        border-radius: 12px;
-        padding: 16px;
-        margin: 12px 0;
-        color: #92400e;
-        font-weight: 500;
-    }
-    .alert-low {
-        background: #d1fae5;
-        border: 1px solid #6ee7b7;
-        border-radius: 12px;
-        padding: 16px;
-        margin: 12px 0;
-        color: #065f46;
-        font-weight: 500;
-    }
-
-    /* Abnormal vital highlight */
-    .vital-abnormal {
-        background: #fff7ed;
-        border: 1px solid #fed7aa;
-        border-radius: 8px;
-        padding: 8px 12px;
-        margin: 4px 0;
-        color: #c2410c;
-        font-size: 0.9rem;
-    }
-
-    /* Buttons */
-    .stButton > button {
-        background: linear-gradient(135deg, #1a4a7a, #2563a8);
-        color: white !important;
-        border: none;
-        border-radius: 10px;
-        padding: 10px 24px;
-        font-weight: 600;
-        font-family: 'DM Sans', sans-serif;
-        transition: all 0.2s;
-        width: 100%;
-    }
-    .stButton > button:hover {
-        background: linear-gradient(135deg, #2563a8, #1a4a7a);
-        transform: translateY(-1px);
-        box-shadow: 0 4px 14px rgba(26,74,122,0.4);
-    }
-
-    /* Input fields */
-    .stNumberInput input, .stTextInput input, .stSelectbox select {
-        border-radius: 8px !important;
-        border: 1.5px solid var(--border) !important;
-    }
-    .stNumberInput input:focus, .stTextInput input:focus {
-        border-color: var(--primary) !important;
-        box-shadow: 0 0 0 3px rgba(26,74,122,0.1) !important;
-    }
-
-    /* Hide default Streamlit branding */
-    #MainMenu, footer { visibility: hidden; }
-    header { visibility: hidden; }
-
-    /* Page padding */
-    .main .block-container { padding-top: 2rem; padding-bottom: 2rem; max-width: 1200px; }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(f"<style>{_theme_css()}</style>", unsafe_allow_html=True)
 
 
 def render_header(title, subtitle=""):
@@ -200,12 +89,14 @@ def render_risk_badge(risk_level):
     """, unsafe_allow_html=True)
 
 
-def render_risk_gauge(risk_score, risk_level):
-    """Render a Plotly gauge chart for risk score."""
+@functools.lru_cache(maxsize=None)
+def _gauge_template(risk_level):
+    """Fully styled gauge for one risk level as a validated figure dict, built on first use."""
+    import plotly.graph_objects as go
     color = RISK_COLORS.get(risk_level, '#gray')
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
-        value=risk_score,
+        value=0,
         number={'suffix': "%", 'font': {'size': 32, 'color': color}},
         title={'text': f"Risk Confidence", 'font': {'size': 14, 'color': '#64748b'}},
         gauge={
@@ -221,7 +112,7 @@ def render_risk_gauge(risk_score, risk_level):
             'threshold': {
                 'line': {'color': color, 'width': 4},
                 'thickness': 0.75,
-                'value': risk_score
+                'value': 0
             }
         }
     ))
@@ -229,11 +120,28 @@ def render_risk_gauge(risk_score, risk_level):
         height=220, margin=dict(l=20, r=20, t=40, b=20),
         paper_bgcolor='white', font={'family': 'DM Sans'}
     )
-    return fig
+    return fig.to_dict()
+
+
+def render_risk_gauge(risk_score, risk_level):
+    """Render a Plotly gauge chart for risk score from the level's template.
+
+    Deliberately not st.cache_data: a cache hit unpickles the Figure, which
+    re-runs plotly's validators and costs more than patching the template.
+    """
+    import plotly.graph_objects as go
+    spec = copy.deepcopy(_gauge_template(risk_level))
+    indicator = spec['data'][0]
+    indicator['value'] = risk_score
+    indicator['gauge']['threshold']['value'] = risk_score
+    # The template was validated when built; re-validating it costs more than building from scratch
+    return go.Figure(spec, _validate=False)
 
 
+@cache_figure(ttl=300, show_spinner=False)
 def render_probability_bars(probabilities):
     """Render a horizontal bar chart of risk probabilities."""
+    import plotly.graph_objects as go
     labels = list(probabilities.keys())
     values = list(probabilities.values())
     colors = [RISK_COLORS[l] for l in labels]
@@ -257,34 +165,57 @@ def render_probability_bars(probabilities):
     return fig
 
 
-def render_assessment_history_chart(assessments):
-    """Render a line chart of risk level trends over time."""
+HISTORY_PANDAS_MIN_ROWS = 500
+
+
+def assessment_history(assessments):
+    """Turn assessment rows into chronologically sorted columns for the chart renderers.
+
+    Returns {column: values}, empty when there are no assessments. Typical
+    per-patient histories are sorted in plain Python; only long ones go
+    through pandas, where its vectorized parse and sort pay off.
+    """
     if not assessments:
+        return {}
+    if len(assessments) > HISTORY_PANDAS_MIN_ROWS:
+        import pandas as pd
+        df = pd.DataFrame(assessments)
+        df['assessed_at'] = pd.to_datetime(df['assessed_at'])
+        df = df.sort_values('assessed_at')
+        return {col: df[col].to_numpy() for col in df.columns}
+
+    rows = sorted(assessments, key=lambda a: a['assessed_at'])
+    history = {col: [row[col] for row in rows] for col in rows[0]}
+    history['assessed_at'] = [datetime.fromisoformat(ts) for ts in history['assessed_at']]
+    return history
+
+
+@cache_figure(ttl=300, show_spinner=False)
+def render_assessment_history_chart(history):
+    """Render a line chart of risk level trends over time from an assessment_history."""
+    if not history:
         return None
 
-    df = pd.DataFrame(assessments)
-    df['assessed_at'] = pd.to_datetime(df['assessed_at'])
-    df = df.sort_values('assessed_at')
-
+    import plotly.graph_objects as go
+    levels = history['risk_level']
     risk_map = {'Low': 1, 'Medium': 2, 'High': 3}
-    df['risk_num'] = df['risk_level'].map(risk_map)
+    risk_num = [risk_map[level] for level in levels]
 
     fig = go.Figure()
     colors_map = {'Low': '#2ecc71', 'Medium': '#f39c12', 'High': '#e74c3c'}
 
-    for risk, color in colors_map.items():
-        mask = df['risk_level'] == risk
-        if mask.any():
-            fig.add_trace(go.Scatter(
-                x=df[mask]['assessed_at'],
-                y=df[mask]['risk_num'],
-                mode='markers',
-                name=risk,
-                marker=dict(color=color, size=12, symbol='circle'),
-            ))
+    # One marker trace colored per point; the y-axis tick labels name the levels
+    fig.add_trace(go.Scatter(
+        x=history['assessed_at'], y=risk_num,
+        mode='markers',
+        marker=dict(color=[colors_map[level] for level in levels], size=12, symbol='circle'),
+        text=list(levels),
+        hovertemplate='%{text}: %{x}<extra></extra>',
+        showlegend=False
+    ))
 
     fig.add_trace(go.Scatter(
-        x=df['assessed_at'], y=df['risk_num'],
+        x=history['assessed_at'], y=risk_num,
         mode='lines', line=dict(color='#94a3b8', width=1.5, dash='dot'),
         showlegend=False
     ))
@@ -296,29 +227,27 @@ def render_assessment_history_chart(assessments):
         height=280,
         margin=dict(l=10, r=10, t=40, b=20),
         paper_bgcolor='white', plot_bgcolor='#f8fafc',
-        font={'family': 'DM Sans'},
-        legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1)
+        font={'family': 'DM Sans'}
     )
     return fig
 
 
-def render_risk_distribution_pie(assessments):
-    """Render a pie chart of risk distribution."""
-    if not assessments:
+@cache_figure(ttl=300, show_spinner=False)
+def render_risk_distribution_pie(history):
+    """Render a pie chart of risk distribution from an assessment_history."""
+    if not history:
         return None
 
-    df = pd.DataFrame(assessments)
-    counts = df['risk_level'].value_counts().reset_index()
-    counts.columns = ['risk_level', 'count']
-
-    fig = px.pie(
-        counts, values='count', names='risk_level',
-        color='risk_level',
-        color_discrete_map=RISK_COLORS,
-        title='Risk Distribution',
+    import plotly.graph_objects as go
+    labels, values = zip(*Counter(history['risk_level']).most_common())
+    fig = go.Figure(go.Pie(
+        labels=labels, values=values,
+        marker=dict(colors=[RISK_COLORS[level] for level in labels]),
+        hovertemplate='risk_level=%{label}<br>count=%{value}<extra></extra>',
         hole=0.4
-    )
+    ))
     fig.update_layout(
+        title='Risk Distribution',
         height=280, margin=dict(l=10, r=10, t=40, b=20),
         paper_bgcolor='white', font={'family': 'DM Sans'},
         legend=dict(orientation='h', yanchor='bottom', y=-0.2)
@@ -326,15 +255,13 @@ def render_risk_distribution_pie(assessments):
     return fig
 
 
-def render_vitals_chart(assessments):
-    """Render a multi-line chart of vitals over time."""
-    if len(assessments) < 2:
+@cache_figure(ttl=300, show_spinner=False)
+def render_vitals_chart(history):
+    """Render a multi-line chart of vitals over time from an assessment_history."""
+    if len(history.get('assessed_at', ())) < 2:
         return None
 
-    df = pd.DataFrame(assessments)
-    df['assessed_at'] = pd.to_datetime(df['assessed_at'])
-    df = df.sort_values('assessed_at')
-
+    import plotly.graph_objects as go
     fig = go.Figure()
     vitals_to_plot = [
         ('heart_rate', 'Heart Rate (bpm)', '#e74c3c'),
@@ -344,9 +271,9 @@ def render_vitals_chart(assessments):
     ]
 
     for col, label, color in vitals_to_plot:
-        if col in df.columns:
+        if col in history:
             fig.add_trace(go.Scatter(
-                x=df['assessed_at'], y=df[col],
+                x=history['assessed_at'], y=history[col],
                 mode='lines+markers', name=label,
                 line=dict(color=color, width=2),
                 marker=dict(size=6)
@@ -372,18 +299,16 @@ def highlight_abnormal_vitals(abnormal_vitals):
         </div>""", unsafe_allow_html=True)
         return
 
-    st.markdown("**⚠️ Abnormal Vitals Detected:**")
+    # One markdown element for the whole list: a header line, then one HTML block
+    rows = []
     for key, info in abnormal_vitals.items():
-        label = VITAL_RANGES.get(key, {}).get('label', key)
-        unit = VITAL_RANGES.get(key, {}).get('unit', '')
+        label, unit = _VITAL_META.get(key, (key, ''))
         direction = "↑ HIGH" if info['status'] == 'high' else "↓ LOW"
-        st.markdown(f"""
-        <div class="vital-abnormal">
-            ⚠️ <strong>{label}</strong>: {info['value']} {unit} — 
-            <span style="font-weight:700;">{direction}</span> 
-            (Normal: {info['normal']} {unit})
-        </div>
-        """, unsafe_allow_html=True)
+        rows.append(
+            f'<div class="vital-abnormal">⚠️ <strong>{label}</strong>: {info["value"]} {unit} — '
+            f'<span style="font-weight:700;">{direction}</span> (Normal: {info["normal"]} {unit})</div>'
+        )
+    st.markdown("**⚠️ Abnormal Vitals Detected:**\n\n" + "\n".join(rows), unsafe_allow_html=True)
 
 
 def simulated_email_alert(patient_name, risk_level, doctor_name=""):
@@ -402,8 +327,9 @@ def simulated_email_alert(patient_name, risk_level, doctor_name=""):
         """, unsafe_allow_html=True)
 
 
+@functools.lru_cache(maxsize=1024)
 def format_datetime(dt_str):
-    """Format a datetime string for display."""
+    """Format a datetime string for display, memoized since tables rerender the same timestamps."""
     try:
         dt = datetime.fromisoformat(dt_str)
         return dt.strftime("%b %d, %Y at %I:%M %p")